@@ -0,0 +1,38 @@
+"""Add order_bill_seq sequence for order ids and bill numbers
+
+Revision ID: 003_order_bill_seq
+Revises: 002_add_client_id
+Create Date: 2026-10-15 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '003_order_bill_seq'
+down_revision = '002_add_client_id'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create order_bill_seq and move it past the numbers already in use"""
+
+    # Step 1: Create the sequence (first value 1000 on an empty database)
+    op.execute(sa.schema.CreateSequence(sa.Sequence('order_bill_seq', start=1000)))
+
+    # Step 2: Seed it from existing orders and numeric bill numbers (up to 18 digits, fits BIGINT)
+    op.execute("""
+        SELECT setval('order_bill_seq', GREATEST(
+            999,
+            COALESCE((SELECT MAX(id_key) FROM orders), 999),
+            COALESCE((SELECT MAX(CAST(bill_number AS BIGINT)) FROM bills WHERE bill_number ~ '^[0-9]{1,18}$'), 999)
+        ), true)
+    """)
+
+
+def downgrade() -> None:
+    """Drop order_bill_seq"""
+
+    op.execute(sa.schema.DropSequence(sa.Sequence('order_bill_seq')))
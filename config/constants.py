@@ -23,6 +23,9 @@ class CacheConfig:
     PRODUCT_ITEM_TTL = 300  # 5 minutes
     CATEGORY_LIST_TTL = 3600  # 1 hour (rarely changes)
     CATEGORY_ITEM_TTL = 3600  # 1 hour
+    CLIENT_EXISTS_TTL = 300  # 5 minutes (clients are rarely deleted)
+    BILL_EXISTS_TTL = 60  # 1 minute (bills are write-heavy)
+    ORDER_NUMBER_SYNC_TTL = 300  # Check the order number counter against the database every 5 minutes
 
 
 class LogConfig:
@@ -54,6 +57,7 @@ class DatabaseConfig:
     DEFAULT_MAX_OVERFLOW = 100
     DEFAULT_POOL_TIMEOUT = 10  # seconds (fail fast for high concurrency)
     DEFAULT_POOL_RECYCLE = 3600  # 1 hour
+    DEFAULT_POOL_USE_LIFO = True  # Reuse the most recently returned connection
 
 
 class ValidationConfig:
@@ -37,10 +37,15 @@ POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '50'))  # Base pool size per worker
 MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '100'))  # Additional connections during peak
 POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '10'))  # Wait time for connection (reduced for production)
 POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '3600'))  # Recycle connections after 1 hour
+POOL_USE_LIFO = os.getenv('DB_POOL_USE_LIFO', 'true').lower() == 'true'  # Reuse most recently returned connection
 
 DATABASE_URI = f'postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}'
 
 # Create engine with optimized connection pooling for high concurrency
+# With LIFO checkout, surplus connections sit idle at the bottom of the stack.
+# pool_recycle only checks a connection's age when it is checked out, so it
+# never reaches them; they are closed by the server's idle timeout, and
+# pool_pre_ping replaces such a connection if it is ever checked out again.
 engine = create_engine(
     DATABASE_URI,
     pool_pre_ping=True,  # Verify connections before using (prevents stale connections)
@@ -48,6 +53,7 @@ engine = create_engine(
     max_overflow=MAX_OVERFLOW,  # Additional connections beyond pool_size
     pool_timeout=POOL_TIMEOUT,  # Seconds to wait before giving up on connection
     pool_recycle=POOL_RECYCLE,  # Recycle connections to prevent stale connections
+    pool_use_lifo=POOL_USE_LIFO,  # Reuse a warm working set of connections first (see above)
     echo=False,  # Disable SQL logging in production for performance
     future=True,  # Use SQLAlchemy 2.0 style
 )
@@ -73,10 +79,38 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+# Moves order_bill_seq past any order id / numeric bill number already in use
+# (rows written before the sequence existed). setval() is only issued when the
+# data is ahead of the sequence, which in practice means the first start after
+# upgrading; a service in use keeps the sequence ahead of the data.
+# Sequences are not transactional: a nextval() running between the read of
+# last_value and the setval() is not protected against. The advisory lock only
+# stops several workers starting at once from racing each other.
+# Legacy numeric bill numbers are cast to BIGINT (the sequence's type); longer
+# than 18 digits they could overflow it and are skipped.
+LOCK_ORDER_BILL_SEQUENCE_SYNC_SQL = "SELECT pg_advisory_xact_lock(hashtext('order_bill_seq'))"
+SYNC_ORDER_BILL_SEQUENCE_SQL = """
+    SELECT setval('order_bill_seq', data.max_number, true)
+    FROM (
+        SELECT GREATEST(
+            COALESCE((SELECT MAX(id_key) FROM orders), 999),
+            COALESCE((SELECT MAX(CAST(bill_number AS BIGINT)) FROM bills WHERE bill_number ~ '^[0-9]{1,18}$'), 999)
+        ) AS max_number
+    ) AS data
+    WHERE data.max_number > (
+        SELECT CASE WHEN is_called THEN last_value ELSE last_value - 1 END FROM order_bill_seq
+    )
+"""
+
+
 def create_tables():
     """Create all tables in the database."""
     try:
         base.metadata.create_all(engine)
+        if engine.dialect.name == 'postgresql':
+            with engine.begin() as connection:
+                connection.execute(text(LOCK_ORDER_BILL_SEQUENCE_SYNC_SQL))
+                connection.execute(text(SYNC_ORDER_BILL_SEQUENCE_SQL))
         logger.info("Tables created successfully.")
     except Exception as e:
         logger.error(f"Error creating tables: {e}")
@@ -37,10 +37,16 @@ class BaseControllerImpl(BaseController):
         self._register_routes()
 
     def _register_routes(self):
-        """Register all CRUD routes with proper dependency injection."""
+        """
+        Register all CRUD routes with proper dependency injection.
+
+        Handlers are plain ``def``: services use a synchronous SQLAlchemy
+        session, so FastAPI runs them in its threadpool instead of blocking
+        the event loop on database I/O.
+        """
 
         @self.router.get("/", response_model=List[self.schema], status_code=status.HTTP_200_OK)
-        async def get_all(
+        def get_all(
             skip: int = 0,
             limit: int = 100,
             db: Session = Depends(get_db)
@@ -50,7 +56,7 @@ class BaseControllerImpl(BaseController):
             return service.get_all(skip=skip, limit=limit)
 
         @self.router.get("/{id_key}", response_model=self.schema, status_code=status.HTTP_200_OK)
-        async def get_one(
+        def get_one(
             id_key: int,
             db: Session = Depends(get_db)
         ):
@@ -59,7 +65,7 @@ class BaseControllerImpl(BaseController):
             return service.get_one(id_key)
 
         @self.router.post("/", response_model=self.schema, status_code=status.HTTP_201_CREATED)
-        async def create(
+        def create(
             schema_in: self.schema,
             db: Session = Depends(get_db)
         ):
@@ -68,7 +74,7 @@ class BaseControllerImpl(BaseController):
             return service.save(schema_in)
 
         @self.router.put("/{id_key}", response_model=self.schema, status_code=status.HTTP_200_OK)
-        async def update(
+        def update(
             id_key: int,
             schema_in: self.schema,
             db: Session = Depends(get_db)
@@ -78,7 +84,7 @@ class BaseControllerImpl(BaseController):
             return service.update(id_key, schema_in)
 
         @self.router.delete("/{id_key}", status_code=status.HTTP_204_NO_CONTENT)
-        async def delete(
+        def delete(
             id_key: int,
             db: Session = Depends(get_db)
         ):
@@ -1,6 +1,7 @@
 """OrderDetail controller with proper dependency injection and rate limiting."""
 from fastapi import Depends, Request, status
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from typing import List
 
 from controllers.base_controller_impl import BaseControllerImpl
@@ -46,4 +47,5 @@ class OrderDetailController(BaseControllerImpl):
             to prevent order spam and abuse.
             """
             service = self.service_factory(db)
-            return service.save(schema_in)
\ No newline at end of file
+            # Synchronous DB work runs in the threadpool to keep the event loop free
+            return await run_in_threadpool(service.save, schema_in)
\ No newline at end of file
@@ -1,9 +1,13 @@
-from sqlalchemy import Column, Float, DateTime, Enum, Integer, ForeignKey
+from sqlalchemy import Column, Float, DateTime, Enum, Integer, ForeignKey, Sequence
 from sqlalchemy.orm import relationship
 
-from models.base_model import BaseModel
+from models.base_model import BaseModel, base
 from models.enums import DeliveryMethod, Status
 
+# Shared counter for order ids and bill numbers (PostgreSQL). Allocating from a
+# sequence is O(1) and safe under concurrent writers.
+order_bill_seq = Sequence("order_bill_seq", start=1000, metadata=base.metadata)
+
 
 class OrderModel(BaseModel):
     __tablename__ = "orders"
@@ -43,6 +43,14 @@ class BaseRepository(ABC):
         :return: BaseSchema
         """
 
+    @abstractmethod
+    def exists(self, id_key: int) -> bool:
+        """
+        Check whether a record with id_key exists
+        :param id_key: int
+        :return: bool
+        """
+
     @abstractmethod
     def find_all(self) -> List[BaseSchema]:
         """
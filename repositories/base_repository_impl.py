@@ -75,6 +75,26 @@ class BaseRepositoryImpl(BaseRepository):
             self.logger.error(f"Error finding {self.model.__name__} with id {id_key}: {e}")
             raise
 
+    def exists(self, id_key: int) -> bool:
+        """
+        Check whether a record exists without loading it
+
+        Issues ``SELECT 1 ... WHERE id_key = :id`` so no columns or
+        relationships are hydrated.
+
+        Args:
+            id_key: The primary key value
+
+        Returns:
+            True if the record exists
+        """
+        try:
+            stmt = select(1).where(self.model.id_key == id_key)
+            return self.session.execute(stmt).first() is not None
+        except Exception as e:
+            self.logger.error(f"Error checking {self.model.__name__} with id {id_key}: {e}")
+            raise
+
     def find_all(self, skip: int = 0, limit: int = 100) -> List[BaseSchema]:
         """
         Find all records with pagination and input validation
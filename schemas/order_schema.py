@@ -1,6 +1,6 @@
 """Order schema with validation."""
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, TypedDict
 from pydantic import Field
 from pydantic import BaseModel
 
@@ -13,10 +13,19 @@ class OrderItemInput(BaseModel):
     quantity: int = Field(..., gt=0, description="Quantity (>0)")
 
 
+class OrderItem(TypedDict):
+    """Plain, already-validated order item used internally by OrderService."""
+
+    product_id: int
+    quantity: int
+
+
 class OrderSchema(BaseSchema):
     """Schema for Order entity with validations."""
 
     date: Optional[datetime] = Field(default=None, description="Order date (auto-set if missing)")
+    # OrderService.save() computes totals in integer cents, so created orders
+    # always hold whole-cent amounts.
     total: float = Field(..., ge=0, description="Total amount (must be >= 0, required)")
     delivery_method: DeliveryMethod = Field(..., description="Delivery method (required)")
     status: Status = Field(default=Status.PENDING, description="Order status")
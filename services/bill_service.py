@@ -3,6 +3,7 @@ from models.bill import BillModel
 from repositories.bill_repository import BillRepository
 from schemas.bill_schema import BillSchema
 from services.base_service_impl import BaseServiceImpl
+from services.cache_service import cache_service
 
 
 class BillService(BaseServiceImpl):
@@ -13,3 +14,12 @@ class BillService(BaseServiceImpl):
             schema=BillSchema,
             db=db
         )
+        self.cache = cache_service
+        self.cache_prefix = "bills"
+
+    def delete(self, id_key: int) -> None:
+        """
+        Delete bill and invalidate its cached existence check
+        """
+        super().delete(id_key)
+        self.cache.delete(self.cache.build_key(self.cache_prefix, "exists", id=id_key))
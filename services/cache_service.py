@@ -16,6 +16,18 @@ from utils.logging_utils import get_sanitized_logger
 
 logger = get_sanitized_logger(__name__)
 
+# Raise an integer key to at least ARGV[1], atomically; never lowers it.
+# SET without EX leaves the key without a TTL.
+_SET_MAX_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]))
+local value = tonumber(ARGV[1])
+if current == nil or current < value then
+    redis.call('SET', KEYS[1], ARGV[1])
+    return value
+end
+return current
+"""
+
 
 class CacheService:
     """
@@ -71,7 +83,8 @@ class CacheService:
         self,
         key: str,
         value: Any,
-        ttl: Optional[int] = None
+        ttl: Optional[int] = None,
+        nx: bool = False
     ) -> bool:
         """
         Set value in cache
@@ -80,9 +93,10 @@ class CacheService:
             key: Cache key
             value: Value to cache (will be JSON serialized if possible)
             ttl: Time to live in seconds (default: REDIS_CACHE_TTL)
+            nx: Only set the key if it does not already exist
 
         Returns:
-            True if successful, False otherwise
+            True if successful (with nx, only if the key was created), False otherwise
         """
         if not self.is_available():
             return False
@@ -93,6 +107,8 @@ class CacheService:
                 value = json.dumps(value)
 
             ttl = ttl or self.default_ttl
+            if nx:
+                return bool(self.redis_client.set(key, value, ex=ttl, nx=True))
             self.redis_client.setex(key, ttl, value)
             return True
 
@@ -120,6 +136,25 @@ class CacheService:
             logger.error(f"Cache DELETE error for key '{key}': {e}")
             return False
 
+    def delete_many(self, keys: List[str]) -> int:
+        """
+        Delete several keys in a single round trip
+
+        Args:
+            keys: Cache keys to delete
+
+        Returns:
+            Number of keys deleted
+        """
+        if not self.is_available() or not keys:
+            return 0
+
+        try:
+            return self.redis_client.delete(*keys)
+        except Exception as e:
+            logger.error(f"Cache DELETE MANY error for {len(keys)} keys: {e}")
+            return 0
+
     def delete_pattern(self, pattern: str) -> int:
         """
         Delete all keys matching pattern
@@ -134,7 +169,8 @@ class CacheService:
             return 0
 
         try:
-            keys = self.redis_client.keys(pattern)
+            # SCAN walks the keyspace incrementally instead of blocking Redis like KEYS
+            keys = list(self.redis_client.scan_iter(match=pattern, count=500))
             if keys:
                 return self.redis_client.delete(*keys)
             return 0
@@ -304,6 +340,26 @@ class CacheService:
             logger.error(f"Cache INCREMENT error for key '{key}': {e}")
             return None
 
+    def set_max(self, key: str, value: int) -> Optional[int]:
+        """
+        Raise an integer key to at least value (compare-and-raise, never lowers it)
+
+        Args:
+            key: Counter key
+            value: Minimum value the key must hold
+
+        Returns:
+            The key's value afterwards or None if cache unavailable
+        """
+        if not self.is_available():
+            return None
+
+        try:
+            return int(self.redis_client.eval(_SET_MAX_SCRIPT, 1, key, value))
+        except Exception as e:
+            logger.error(f"Cache SET MAX error for key '{key}': {e}")
+            return None
+
     def expire(self, key: str, ttl: int) -> bool:
         """
         Set expiration on existing key
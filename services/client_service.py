@@ -3,6 +3,7 @@ from models.client import ClientModel
 from repositories.client_repository import ClientRepository
 from schemas.client_schema import ClientSchema
 from services.base_service_impl import BaseServiceImpl
+from services.cache_service import cache_service
 
 
 class ClientService(BaseServiceImpl):
@@ -13,3 +14,14 @@ class ClientService(BaseServiceImpl):
             schema=ClientSchema,
             db=db
         )
+        self.cache = cache_service
+        self.cache_prefix = "clients"
+
+    def delete(self, id_key: int) -> None:
+        """
+        Delete client and invalidate its cached existence check
+        """
+        super().delete(id_key)
+        # The client's bills are kept (client_id set to NULL), so their
+        # cached existence checks stay valid
+        self.cache.delete(self.cache.build_key(self.cache_prefix, "exists", id=id_key))
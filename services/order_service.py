@@ -1,23 +1,132 @@
 """OrderService with foreign key validation and business logic."""
+import os
 from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from typing import List, Optional, Union
+from sqlalchemy import Integer, and_, bindparam, cast, func, insert, literal, select, union_all, update
 from sqlalchemy.orm import Session
 
 from repositories.order_repository import OrderRepository
 from repositories.client_repository import ClientRepository
 from repositories.bill_repository import BillRepository
 from repositories.base_repository_impl import InstanceNotFoundError
-from schemas.order_schema import OrderSchema, OrderItemInput
+from schemas.order_schema import OrderSchema, OrderItem, OrderItemInput
 from services.base_service_impl import BaseServiceImpl
 from utils.logging_utils import get_sanitized_logger
 from models.bill import BillModel
 from models.enums import PaymentType
-from models.order import OrderModel
+from models.order import OrderModel, order_bill_seq
 from models.order_detail import OrderDetailModel
 from models.product import ProductModel
 from services.cache_service import cache_service
+from services.product_service import PRODUCT_LIST_VERSION_KEY
+from config.constants import CacheConfig
 
 logger = get_sanitized_logger(__name__)
 
+# Debug/paranoid mode: re-read the created order and fully validate the response
+VALIDATE_ORDER_RESPONSE = os.getenv('ORDER_VALIDATE_RESPONSE', 'false').lower() == 'true'
+# Fallback: drop every products:* key after an order instead of only the touched ones
+FULL_PRODUCT_CACHE_INVALIDATION = os.getenv('ORDER_FULL_PRODUCT_CACHE_INVALIDATION', 'false').lower() == 'true'
+
+# The statements below are built once at import time and only receive bound
+# parameters per call, so save() doesn't rebuild them and every execution
+# hits the same compiled-cache entry.
+
+# Products referenced by an order, locked (FOR UPDATE) until commit. Rows are
+# locked in id_key order so concurrent orders sharing products can't deadlock.
+_PRODUCTS_BY_IDS = (
+    select(ProductModel.id_key, ProductModel.price, ProductModel.stock)
+    .where(ProductModel.id_key.in_(bindparam("ids", expanding=True)))
+    .order_by(ProductModel.id_key)
+    .with_for_update()
+)
+
+_NEXT_ORDER_NUMBER = select(order_bill_seq.next_value())
+
+_INSERT_BILL = insert(BillModel).returning(BillModel.id_key)
+
+_INSERT_ORDER = insert(OrderModel)
+
+_RENUMBER_BILL = (
+    update(BillModel)
+    .where(BillModel.id_key == bindparam("bill_id"))
+    .values(bill_number=bindparam("number"))
+)
+
+
+def _max_order_number_stmt():
+    """
+    Build the query for the highest order/bill number in use.
+
+    Only used where there is no sequence (SQLite in development/tests). The
+    maximum order id and the maximum numeric bill number are computed by the
+    database in a single round trip; non-numeric (legacy) bill numbers are
+    filtered out server-side.
+    """
+    numeric_bill = and_(
+        BillModel.bill_number != "",
+        BillModel.bill_number.op("NOT GLOB")("*[^0-9]*"),
+    )
+    max_order = select(func.max(OrderModel.id_key).label("value"))
+    max_bill = select(
+        func.max(cast(BillModel.bill_number, Integer)).label("value")
+    ).where(numeric_bill)
+    # No GREATEST() in SQLite: take the MAX over both aggregates
+    maxima = union_all(max_order, max_bill).subquery()
+    return select(func.max(maxima.c.value))
+
+
+_MAX_ORDER_NUMBER = _max_order_number_stmt()
+
+
+def _decrement_stock_stmt(stock_updates: list[dict]):
+    """
+    Build the atomic, guarded stock decrement for every product of an order.
+
+    One ``UPDATE products ... FROM (<requested quantities>) RETURNING id_key``:
+    a row whose stock is lower than the requested quantity is left untouched
+    and its id is missing from the result. The quantities are a
+    ``SELECT ... UNION ALL`` derived table rather than ``VALUES``, whose column
+    alias list SQLite doesn't accept. Its shape depends on the number of
+    products, so unlike the statements above it is built per call.
+    """
+    requested = union_all(*(
+        select(literal(params["pid"], Integer).label("pid"), literal(params["q"], Integer).label("q"))
+        for params in stock_updates
+    )).subquery("requested")
+    return (
+        update(ProductModel)
+        .where(ProductModel.id_key == requested.c.pid, ProductModel.stock >= requested.c.q)
+        .values(stock=ProductModel.stock - requested.c.q)
+        .returning(ProductModel.id_key)
+    )
+
+
+def _to_cents(amount) -> int:
+    """Convert a money amount to whole cents, rounding half up.
+
+    Floats go through their shortest repr, so 0.125 becomes 13 cents rather
+    than inheriting binary representation error.
+    """
+    if not isinstance(amount, Decimal):
+        amount = Decimal(str(amount))
+    return int((amount * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def _as_order_items(items: Optional[List[Union[OrderItemInput, OrderItem]]]) -> List[OrderItem]:
+    """
+    Normalize order items to plain dicts.
+
+    Items validated at the API layer arrive as OrderItemInput; internal callers
+    that skip validation (``OrderSchema.model_construct``) may pass dicts.
+    """
+    return [
+        item if isinstance(item, dict)
+        else {"product_id": item.product_id, "quantity": item.quantity}
+        for item in items or []
+    ]
+
 
 class OrderService(BaseServiceImpl):
     """Service for Order entity with validation and business logic."""
@@ -33,152 +142,310 @@ class OrderService(BaseServiceImpl):
         self._bill_repository = BillRepository(db)
         self._db = db
         self._session = db
+        self.cache = cache_service
+
+    def _ensure_exists(self, repository, cache_prefix: str, label: str, id_key: int, ttl: int) -> None:
+        """
+        Validate that a referenced record exists, caching positive answers.
+
+        Cache key pattern: {cache_prefix}:exists:id:{id_key}. ClientService and
+        BillService invalidate it on delete.
+
+        Raises:
+            InstanceNotFoundError: If the record doesn't exist
+        """
+        cache_key = self.cache.build_key(cache_prefix, "exists", id=id_key)
+        if self.cache.get(cache_key) is not None:
+            return
+        if not repository.exists(id_key):
+            logger.error(f"{label} with id {id_key} not found")
+            raise InstanceNotFoundError(f"{label} with id {id_key} not found")
+        self.cache.set(cache_key, 1, ttl)
+
+    def _ensure_client_exists(self, client_id: int) -> None:
+        """Validate client exists (cached)."""
+        self._ensure_exists(
+            self._client_repository, "clients", "Client", client_id, CacheConfig.CLIENT_EXISTS_TTL
+        )
+
+    def _ensure_bill_exists(self, bill_id: int) -> None:
+        """Validate bill exists (cached, short TTL)."""
+        self._ensure_exists(
+            self._bill_repository, "bills", "Bill", bill_id, CacheConfig.BILL_EXISTS_TTL
+        )
 
     def _generate_next_order_number(self) -> int:
         """
         Generate the next sequential order/bill number starting at 1000.
 
+        Uses the ``order_bill_seq`` sequence when the database supports it.
+        Otherwise (SQLite in development/tests) falls back to a Redis counter,
+        or to scanning the current maximum when the cache is unavailable.
+
         Returns:
             int: Next order number
         """
+        if self._session.get_bind().dialect.supports_sequences:
+            return self._session.execute(_NEXT_ORDER_NUMBER).scalar_one()
+        return self._next_number_from_cache()
+
+    def _next_number_from_cache(self) -> int:
+        """
+        Allocate the next order number with an atomic Redis INCR.
+
+        Cache key: order:next_number, without a TTL: numbers handed out but not
+        yet committed are only known to the counter. At most once per
+        ORDER_NUMBER_SYNC_TTL (marker key order:next_number:synced) the counter
+        is raised to the database maximum if that is ahead, so rows inserted
+        outside this service are skipped. It never moves backwards.
+        """
+        cache_key = self.cache.build_key("order", "next_number")
+        sync_key = self.cache.build_key("order", "next_number", "synced")
+        if self.cache.is_available():
+            if self.cache.set(sync_key, 1, CacheConfig.ORDER_NUMBER_SYNC_TTL, nx=True):
+                self.cache.set_max(cache_key, self._max_order_number())
+            next_number = self.cache.increment(cache_key)
+            # A counter lost from Redis (eviction, flush) restarts at 1: raise it and allocate again
+            if next_number is not None and next_number < 1000:
+                self.cache.set_max(cache_key, self._max_order_number())
+                next_number = self.cache.increment(cache_key)
+            if next_number is not None:
+                return next_number
+        return self._max_order_number() + 1
+
+    def _max_order_number(self) -> int:
+        """
+        Return the highest order/bill number in use (999 if there is none).
+
+        See _max_order_number_stmt() for the query.
+        """
         max_val = 999
         try:
-            max_order = (
-                self._session.query(OrderModel.id_key)
-                .order_by(OrderModel.id_key.desc())
-                .limit(1)
-                .scalar()
-            )
-            if max_order and max_order > max_val:
-                max_val = max_order
-
-            rows = self._session.query(BillModel.bill_number).all()
-            for (bn,) in rows:
-                try:
-                    num = int(bn)
-                    if num > max_val:
-                        max_val = num
-                except (ValueError, TypeError):
-                    continue
+            current = self._session.execute(_MAX_ORDER_NUMBER).scalar()
+            if current is not None and current > max_val:
+                max_val = current
         except Exception as e:
             logger.warning(f"Could not compute next order number, defaulting to 1000. Reason: {e}")
-        return max_val + 1
+        return max_val
+
+    def _decrement_stock(self, stock_updates: list[dict]) -> None:
+        """
+        Decrement product stock with a single guarded UPDATE.
+
+        Args:
+            stock_updates: One ``{"pid": product_id, "q": quantity}`` per product
+
+        Raises:
+            ValueError: Naming every product that no longer has enough stock
+        """
+        updated = set(self._session.execute(_decrement_stock_stmt(stock_updates)).scalars())
+        short = {params["pid"]: params["q"] for params in stock_updates if params["pid"] not in updated}
+        if short:
+            # Re-read the stock of the rows the guard skipped, and only those
+            rows = self._session.execute(_PRODUCTS_BY_IDS, {"ids": list(short)}).all()
+            self._check_stock({row.id_key: row for row in rows}, short)
+            product_ids = ", ".join(str(product_id) for product_id in short)
+            raise ValueError(
+                f"No hay stock suficiente para alguno de los productos ({product_ids}); "
+                f"el stock cambió durante la operación."
+            )
 
     def save(self, schema: OrderSchema) -> OrderSchema:
         """
         Create a new order with validation and generate a matching bill number.
 
         Order ID and bill number share the same counter (starting at 1000) so they stay in sync.
+        Everything runs in one transaction, committed on success and rolled back on any
+        error. A transaction the session already autobegan (e.g. by refreshing an expired
+        attribute) is the one committed.
+
+        Internal callers holding pre-validated data can skip pydantic validation with
+        ``OrderSchema.model_construct(..., items=[{"product_id": 1, "quantity": 2}])``.
         """
-        # Validate client exists
+        items = _as_order_items(schema.items)
+
+        try:
+            with self._session.get_transaction() or self._session.begin():
+                order_id = self._create_order(schema, items)
+        except Exception as e:
+            logger.error(f"Error creating order with items: {e}")
+            raise
+
+        # Only after a successful commit
+        logger.info(f"Order {order_id} created with {len(items)} items; stock actualizado.")
+        self._invalidate_product_cache({item["product_id"] for item in items})
+
+        if VALIDATE_ORDER_RESPONSE:
+            return OrderSchema.model_validate(self._session.get(OrderModel, order_id))
+        # Every field is already known and was validated on the way in: skip the
+        # refresh SELECT and pydantic re-validation. Same shape as reading the
+        # order back (items/discount_pct are not stored on the order).
+        return OrderSchema.model_construct(
+            id_key=order_id,
+            date=schema.date,
+            total=schema.total,
+            delivery_method=schema.delivery_method,
+            status=schema.status,
+            client_id=schema.client_id,
+            bill_id=schema.bill_id,
+        )
+
+    @staticmethod
+    def _check_stock(product_cache: dict, requested: dict) -> None:
+        """
+        Check the total requested per product against its stock.
+
+        Raises:
+            ValueError: Naming every product without enough stock
+        """
+        short = [
+            (product_id, product_cache[product_id].stock, quantity)
+            for product_id, quantity in requested.items()
+            if product_cache[product_id].stock is None or product_cache[product_id].stock < quantity
+        ]
+        if len(short) == 1:
+            product_id, stock, quantity = short[0]
+            raise ValueError(
+                f"No hay stock suficiente para el producto {product_id}. "
+                f"Disponible: {stock}, solicitado: {quantity}."
+            )
+        if short:
+            detail = "; ".join(
+                f"producto {product_id} (disponible: {stock}, solicitado: {quantity})"
+                for product_id, stock, quantity in short
+            )
+            raise ValueError(f"No hay stock suficiente para los productos: {detail}.")
+
+    def _invalidate_product_cache(self, product_ids) -> None:
+        """Drop cached reads that include the stock of the ordered products."""
         try:
-            self._client_repository.find(schema.client_id)
-        except InstanceNotFoundError:
-            logger.error(f"Client with id {schema.client_id} not found")
-            raise InstanceNotFoundError(f"Client with id {schema.client_id} not found")
+            if FULL_PRODUCT_CACHE_INVALIDATION:
+                self.cache.delete_pattern("products:*")
+                return
+            self.cache.delete_many([
+                self.cache.build_key("products", "id", id=product_id)
+                for product_id in product_ids
+            ])
+            # List pages may hold any product: move them to a new version (O(1))
+            self.cache.increment(PRODUCT_LIST_VERSION_KEY)
+        except Exception as e:
+            logger.warning(f"No se pudo invalidar la caché de productos: {e}")
 
-        items: list[OrderItemInput] = schema.items or []
-        subtotal = 0.0
+    def _create_order(self, schema: OrderSchema, items: List[OrderItem]) -> int:
+        """
+        Validate and write the order, its bill, its details and the stock changes.
+
+        Must run inside the transaction opened by save().
+
+        Returns:
+            The new order's id_key
+
+        Raises:
+            InstanceNotFoundError: If the client, a product or the bill doesn't exist
+            ValueError: If there isn't enough stock
+        """
+        # Validate client exists
+        self._ensure_client_exists(schema.client_id)
 
-        # Validate stock and compute subtotal
+        # Load only the columns needed (id_key, price, stock) for every referenced
+        # product in a single round trip. Rows are locked (FOR UPDATE) so
+        # concurrent orders cannot decrement the same stock.
         product_cache = {}
+        ids = {item["product_id"] for item in items}
+        if ids:
+            rows = self._session.execute(_PRODUCTS_BY_IDS, {"ids": list(ids)}).all()
+            product_cache = {row.id_key: row for row in rows}
+            missing = ids - product_cache.keys()
+            if missing:
+                raise InstanceNotFoundError(f"Product with id {min(missing)} not found")
+
+        # Single pass over the items: total the quantity requested per product,
+        # compute the subtotal and build the order detail rows (order_id is
+        # filled in once the number is allocated). Stock is checked afterwards,
+        # once per product rather than once per line.
+        # Money is summed in integer cents; floats only appear in what is stored.
+        price_cents = {product_id: _to_cents(row.price or 0) for product_id, row in product_cache.items()}
+        subtotal_cents = 0
+        requested: dict[int, int] = {}
+        detail_rows = []
         for item in items:
-            product = self._session.get(ProductModel, item.product_id)
-            if product is None:
-                raise InstanceNotFoundError(f"Product with id {item.product_id} not found")
-            if product.stock is None or product.stock < item.quantity:
-                raise ValueError(
-                    f"No hay stock suficiente para el producto {product.id_key or product.id}. "
-                    f"Disponible: {product.stock}, solicitado: {item.quantity}."
-                )
-            product_cache[item.product_id] = product
-            price = product.price or 0
-            subtotal += price * item.quantity
+            product_id = item["product_id"]
+            quantity = item["quantity"]
+            unit_cents = price_cents[product_id]
+            requested[product_id] = requested.get(product_id, 0) + quantity
+            subtotal_cents += unit_cents * quantity
+            detail_rows.append({
+                "product_id": product_id,
+                "quantity": quantity,
+                "price": unit_cents / 100,
+            })
+        self._check_stock(product_cache, requested)
+        stock_updates = [{"pid": product_id, "q": quantity} for product_id, quantity in requested.items()]
 
         # Apply discount and shipping (0)
         discount_pct = schema.discount_pct or 0
-        discount_amount = subtotal * discount_pct / 100 if discount_pct > 0 else 0
-        total = max(subtotal - discount_amount, 0)
+        discount_cents = 0
+        if discount_pct > 0:
+            # Exact percentage of an integer amount, rounded half up to the cent
+            discount_cents = int(
+                (subtotal_cents * Decimal(str(discount_pct)) / 100).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+            )
+        discount_amount = discount_cents / 100
+        total = max(subtotal_cents - discount_cents, 0) / 100
         schema.total = total
         schema.date = schema.date or datetime.utcnow()
 
-        # Shared counter for order id and bill number
+        # Update stock: one batched, guarded UPDATE computed server-side
+        if stock_updates:
+            self._decrement_stock(stock_updates)
+
+        if schema.bill_id is not None:
+            self._ensure_bill_exists(schema.bill_id)
+
+        # Shared counter for order id and bill number. Allocated only once the
+        # order passed validation, so rejected orders don't use up a number.
         next_number = self._generate_next_order_number()
+        for row in detail_rows:
+            row["order_id"] = next_number
 
-        try:
-            # Update stock
-            for item in items:
-                product = product_cache[item.product_id]
-                product.stock -= item.quantity
-                if product.stock < 0:
-                    raise ValueError(
-                        f"No hay stock suficiente para el producto {product.id_key or product.id}. "
-                        f"Disponible: {product.stock}, solicitado: {item.quantity}."
-                    )
-                self._session.add(product)
-
-            # Create order with explicit id_key (sync with bill number)
-            order_model = OrderModel(
-                id_key=next_number,
-                date=schema.date,
-                total=total,
-                delivery_method=schema.delivery_method,
-                status=schema.status,
-                client_id=schema.client_id,
+        # Create or update bill so bill_number matches order id
+        if schema.bill_id is None:
+            # INSERT ... RETURNING hands back the new id without a flush
+            schema.bill_id = self._session.execute(_INSERT_BILL, {
+                "bill_number": str(next_number),
+                "discount": discount_amount,
+                "date": datetime.utcnow().date(),
+                "total": total,
+                "payment_type": PaymentType.CASH,
+                "client_id": schema.client_id,
+            }).scalar_one()
+            logger.info(f"Generated bill {next_number} for order (bill_id={schema.bill_id})")
+        else:
+            # Renumber the existing bill in place; rowcount catches a bill deleted meanwhile
+            result = self._session.execute(
+                _RENUMBER_BILL, {"bill_id": schema.bill_id, "number": str(next_number)}
             )
-            self._session.add(order_model)
-            self._session.flush()
-
-            # Create or update bill so bill_number matches order id
-            if schema.bill_id is None:
-                bill_model = BillModel(
-                    bill_number=str(next_number),
-                    discount=discount_amount,
-                    date=datetime.utcnow().date(),
-                    total=total,
-                    payment_type=PaymentType.CASH,
-                    client_id=schema.client_id,
-                )
-                self._session.add(bill_model)
-                self._session.flush()
-                schema.bill_id = bill_model.id_key
-                logger.info(f"Generated bill {bill_model.bill_number} for order (bill_id={schema.bill_id})")
-            else:
-                bill = self._session.get(BillModel, schema.bill_id)
-                if bill is None:
-                    logger.error(f"Bill with id {schema.bill_id} not found")
-                    raise InstanceNotFoundError(f"Bill with id {schema.bill_id} not found")
-                bill.bill_number = str(next_number)
-                self._session.add(bill)
-                self._session.flush()
-
-            # Link order to bill
-            order_model.bill_id = schema.bill_id
-            self._session.add(order_model)
-
-            # Create order details
-            for item in items:
-                product = product_cache[item.product_id]
-                od = OrderDetailModel(
-                    order_id=order_model.id_key,
-                    product_id=item.product_id,
-                    quantity=item.quantity,
-                    price=product.price,
-                )
-                self._session.add(od)
-
-            self._session.commit()
-            logger.info(f"Order {order_model.id_key} created with {len(items)} items; stock actualizado.")
-            # Invalidate product caches to reflect new stock
-            try:
-                cache_service.delete_pattern("products:*")
-            except Exception as e:
-                logger.warning(f"No se pudo invalidar la caché de productos: {e}")
-            return OrderSchema.model_validate(order_model)
-        except Exception as e:
-            self._session.rollback()
-            logger.error(f"Error creating order with items: {e}")
-            raise
+            if result.rowcount == 0:
+                logger.error(f"Bill with id {schema.bill_id} not found")
+                raise InstanceNotFoundError(f"Bill with id {schema.bill_id} not found")
+
+        # Create order with explicit id_key (sync with bill number). It must
+        # exist before its details are inserted.
+        self._session.execute(_INSERT_ORDER, {
+            "id_key": next_number,
+            "date": schema.date,
+            "total": total,
+            "delivery_method": schema.delivery_method,
+            "status": schema.status,
+            "client_id": schema.client_id,
+            "bill_id": schema.bill_id,
+        })
+
+        # Create order details in one multi-row INSERT
+        if detail_rows:
+            self._session.execute(insert(OrderDetailModel), detail_rows)
+
+        return next_number
 
     def to_model(self, schema: OrderSchema) -> OrderModel:
         """Ensure required fields (like date) are set before persisting."""
@@ -208,19 +475,11 @@ class OrderService(BaseServiceImpl):
         """
         # Validate client exists if being updated
         if schema.client_id is not None:
-            try:
-                self._client_repository.find(schema.client_id)
-            except InstanceNotFoundError:
-                logger.error(f"Client with id {schema.client_id} not found")
-                raise InstanceNotFoundError(f"Client with id {schema.client_id} not found")
+            self._ensure_client_exists(schema.client_id)
 
         # Validate bill exists if being updated
         if schema.bill_id is not None:
-            try:
-                self._bill_repository.find(schema.bill_id)
-            except InstanceNotFoundError:
-                logger.error(f"Bill with id {schema.bill_id} not found")
-                raise InstanceNotFoundError(f"Bill with id {schema.bill_id} not found")
+            self._ensure_bill_exists(schema.bill_id)
 
         logger.info(f"Updating order {id_key}")
         return super().update(id_key, schema)
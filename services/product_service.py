@@ -12,6 +12,10 @@ from utils.logging_utils import get_sanitized_logger
 
 logger = get_sanitized_logger(__name__)  # P11: Sanitized logging
 
+# Counter embedded in every product list cache key. Bumping it invalidates all
+# cached pages at once without scanning the keyspace; old pages expire by TTL.
+PRODUCT_LIST_VERSION_KEY = "products:list:ver"
+
 
 class ProductService(BaseServiceImpl):
     """Service for Product entity with caching."""
@@ -30,7 +34,7 @@ class ProductService(BaseServiceImpl):
         """
         Get all products with caching
 
-        Cache key pattern: products:list:skip:{skip}:limit:{limit}
+        Cache key pattern: products:list:limit:{limit}:skip:{skip}:v:{version}
         TTL: 5 minutes (default REDIS_CACHE_TTL)
         """
         # Build cache key
@@ -38,7 +42,8 @@ class ProductService(BaseServiceImpl):
             self.cache_prefix,
             "list",
             skip=skip,
-            limit=limit
+            limit=limit,
+            v=self._list_version()
         )
 
         # Try to get from cache
@@ -168,9 +173,13 @@ class ProductService(BaseServiceImpl):
 
         self._invalidate_list_cache()
 
+    def _list_version(self) -> int:
+        """Current product list cache version (0 until first invalidation)"""
+        version = self.cache.get(PRODUCT_LIST_VERSION_KEY)
+        return int(version) if version is not None else 0
+
     def _invalidate_list_cache(self):
-        """Invalidate all product list caches"""
-        pattern = f"{self.cache_prefix}:list:*"
-        deleted_count = self.cache.delete_pattern(pattern)
-        if deleted_count > 0:
-            logger.info(f"Invalidated {deleted_count} product list cache entries")
+        """Invalidate all product list caches by bumping their version"""
+        version = self.cache.increment(PRODUCT_LIST_VERSION_KEY)
+        if version is not None:
+            logger.info(f"Product list cache moved to version {version}")
@@ -1,4 +1,5 @@
 """Pytest configuration and fixtures for testing."""
+import fnmatch
 import os
 import pytest
 from sqlalchemy import create_engine
@@ -286,23 +287,45 @@ def mock_redis(monkeypatch):
         def get(self, key):
             return self.data.get(key)
 
-        def set(self, key, value, ex=None):
+        def set(self, key, value, ex=None, nx=False):
+            if nx and key in self.data:
+                return None
             self.data[key] = value
             if ex:
                 self.expirations[key] = ex
             return True
 
-        def delete(self, key):
-            if key in self.data:
-                del self.data[key]
-            if key in self.expirations:
-                del self.expirations[key]
-            return True
+        def setex(self, key, ttl, value):
+            return self.set(key, value, ex=ttl)
+
+        def delete(self, *keys):
+            deleted = 0
+            for key in keys:
+                if key in self.data:
+                    del self.data[key]
+                    deleted += 1
+                self.expirations.pop(key, None)
+            return deleted
 
         def incr(self, key):
-            current = int(self.data.get(key, 0))
-            self.data[key] = str(current + 1)
-            return current + 1
+            return self.incrby(key, 1)
+
+        def incrby(self, key, amount):
+            current = int(self.data.get(key, 0)) + amount
+            self.data[key] = str(current)
+            return current
+
+        def eval(self, script, numkeys, key, value):
+            # Stands in for CacheService.set_max's compare-and-raise script
+            current = self.data.get(key)
+            if current is None or int(current) < int(value):
+                self.data[key] = str(value)
+                self.expirations.pop(key, None)
+                return int(value)
+            return int(current)
+
+        def scan_iter(self, match=None, count=None):
+            return [key for key in list(self.data) if match is None or fnmatch.fnmatchcase(key, match)]
 
         def expire(self, key, seconds):
             self.expirations[key] = seconds
@@ -338,3 +361,51 @@ def mock_redis(monkeypatch):
             return results
 
     return MockRedis()
+
+
+@pytest.fixture
+def mock_cache(monkeypatch, mock_redis):
+    """Point the global cache_service at the mock Redis client."""
+    from services.cache_service import cache_service
+
+    monkeypatch.setattr(cache_service, "redis_client", mock_redis)
+    monkeypatch.setattr(cache_service, "enabled", True)
+    return mock_redis
+
+
+@pytest.fixture
+def order_db(db_session: Session):
+    """Seed a category and a client for OrderService tests (committed)."""
+    from models.category import CategoryModel
+    from models.client import ClientModel
+
+    category = CategoryModel(name="Groceries")
+    client = ClientModel(
+        name="Jane",
+        lastname="Roe",
+        email="jane.roe@example.com",
+        telephone="+1234567891"
+    )
+    db_session.add_all([category, client])
+    db_session.commit()
+
+    return {"category": category, "client": client}
+
+
+@pytest.fixture
+def make_product(db_session: Session, order_db):
+    """Factory creating committed products in the order_db category."""
+    from models.product import ProductModel
+
+    def _make_product(price: float = 10.0, stock: int = 10) -> ProductModel:
+        product = ProductModel(
+            name=f"Product {price}",
+            price=price,
+            stock=stock,
+            category_id=order_db["category"].id_key
+        )
+        db_session.add(product)
+        db_session.commit()
+        return product
+
+    return _make_product
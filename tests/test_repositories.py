@@ -230,6 +230,16 @@ class TestClientRepository:
 
         assert result.age == 35
 
+    def test_client_exists(self, db_session):
+        """Test checking whether a client exists without loading it."""
+        repo = ClientRepository(db_session)
+        client = ClientModel(name="John", lastname="Doe", email="john@example.com")
+        db_session.add(client)
+        db_session.commit()
+
+        assert repo.exists(client.id_key) is True
+        assert repo.exists(9999) is False
+
 
 class TestAddressRepository:
     """Tests for AddressRepository."""
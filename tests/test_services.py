@@ -3,6 +3,8 @@ import pytest
 from datetime import datetime, date
 from unittest.mock import Mock, patch
 
+from sqlalchemy import event, func, select, update
+
 from repositories.base_repository_impl import InstanceNotFoundError
 from services.category_service import CategoryService
 from services.product_service import ProductService
@@ -23,6 +25,10 @@ from schemas.order_detail_schema import OrderDetailSchema
 from schemas.review_schema import ReviewSchema
 
 from models.enums import DeliveryMethod, Status, PaymentType
+from models.bill import BillModel
+from models.order import OrderModel
+from models.order_detail import OrderDetailModel
+from models.product import ProductModel
 
 
 class TestCategoryService:
@@ -156,6 +162,16 @@ class TestClientService:
         assert result.id_key == client.id_key
         assert result.name == "John Doe"
 
+    def test_delete_client_drops_cached_existence(self, db_session, order_db, mock_cache):
+        """Test that deleting a client drops its clients:exists cache entry."""
+        service = ClientService(db_session)
+        client_id = order_db["client"].id_key
+        mock_cache.set(f"clients:exists:id:{client_id}", "1")
+
+        service.delete(client_id)
+
+        assert f"clients:exists:id:{client_id}" not in mock_cache.data
+
 
 class TestOrderService:
     """Tests for OrderService with FK validation."""
@@ -259,6 +275,349 @@ class TestOrderService:
         assert result.total == 1000.0
         assert result.status == Status.IN_PROGRESS
 
+    def test_save_order_caches_client_existence(self, db_session, order_db, make_product, mock_cache):
+        """Test that a positive client check is cached under clients:exists:id:{id}."""
+        service = OrderService(db_session)
+        product = make_product()
+        client_id = order_db["client"].id_key
+
+        service.save(self._order_schema(client_id, [(product.id_key, 1)]))
+
+        assert mock_cache.data[f"clients:exists:id:{client_id}"] == "1"
+
+    def test_update_order_with_unknown_bill(self, db_session, order_db, mock_cache):
+        """Test that update() still rejects an unknown bill, and doesn't cache the miss."""
+        service = OrderService(db_session)
+        client_id = order_db["client"].id_key
+        mock_cache.set(f"clients:exists:id:{client_id}", "1")
+
+        schema = OrderSchema(
+            total=10.0,
+            delivery_method=DeliveryMethod.HOME_DELIVERY,
+            client_id=client_id,
+            bill_id=9999
+        )
+
+        with pytest.raises(InstanceNotFoundError) as exc_info:
+            service.update(1, schema)
+
+        assert "Bill with id 9999 not found" in str(exc_info.value)
+        assert "bills:exists:id:9999" not in mock_cache.data
+
+    def test_max_order_number_ignores_legacy_bill_numbers(self, db_session):
+        """Test that non-numeric bill numbers are skipped when computing the highest number."""
+        service = OrderService(db_session)
+        for bill_number in ["1200", "1150", "A-12", "9999a", "12a", ""]:
+            db_session.add(BillModel(bill_number=bill_number, total=1.0, payment_type=PaymentType.CASH))
+        db_session.add(OrderModel(
+            id_key=1100,
+            date=datetime.utcnow(),
+            total=1.0,
+            delivery_method=DeliveryMethod.HOME_DELIVERY,
+            status=Status.PENDING
+        ))
+        db_session.commit()
+
+        assert service._max_order_number() == 1200
+
+    def test_max_order_number_empty_database(self, db_session):
+        """Test that the highest number defaults to 999 when there are no orders or bills."""
+        service = OrderService(db_session)
+
+        assert service._max_order_number() == 999
+
+    def test_next_order_number_seeds_counter_then_increments(self, db_session, mock_cache):
+        """Test that the Redis counter is seeded from the database maximum, then only INCRed."""
+        service = OrderService(db_session)
+        db_session.add(BillModel(bill_number="1500", total=1.0, payment_type=PaymentType.CASH))
+        db_session.commit()
+
+        assert service._generate_next_order_number() == 1501
+        assert mock_cache.data["order:next_number"] == "1501"
+        assert "order:next_number" not in mock_cache.expirations
+
+        # Not re-checked against the database until the sync marker expires
+        db_session.add(BillModel(bill_number="1600", total=1.0, payment_type=PaymentType.CASH))
+        db_session.commit()
+        assert service._generate_next_order_number() == 1502
+
+    def test_next_order_number_sync_only_moves_forward(self, db_session, mock_cache):
+        """Test that syncing with the database raises the counter but never lowers it."""
+        service = OrderService(db_session)
+        db_session.add(BillModel(bill_number="1500", total=1.0, payment_type=PaymentType.CASH))
+        db_session.commit()
+        # Numbers up to 1700 handed out, not all committed yet
+        mock_cache.set("order:next_number", "1700")
+
+        assert service._generate_next_order_number() == 1701
+
+        db_session.add(BillModel(bill_number="2000", total=1.0, payment_type=PaymentType.CASH))
+        db_session.commit()
+        mock_cache.delete("order:next_number:synced")
+
+        assert service._generate_next_order_number() == 2001
+
+    def test_next_order_number_counter_lost(self, db_session, mock_cache):
+        """Test that a counter lost from Redis doesn't restart numbering at 1."""
+        service = OrderService(db_session)
+        db_session.add(BillModel(bill_number="1500", total=1.0, payment_type=PaymentType.CASH))
+        db_session.commit()
+        mock_cache.set("order:next_number:synced", "1", ex=300)
+
+        assert service._generate_next_order_number() == 1501
+        assert service._generate_next_order_number() == 1502
+
+    @staticmethod
+    def _order_schema(client_id, items, discount_pct=0):
+        """Order for client_id with (product_id, quantity) items."""
+        return OrderSchema(
+            total=0,
+            delivery_method=DeliveryMethod.HOME_DELIVERY,
+            client_id=client_id,
+            items=[{"product_id": pid, "quantity": quantity} for pid, quantity in items],
+            discount_pct=discount_pct
+        )
+
+    @staticmethod
+    def _count_commits(engine):
+        """Record every COMMIT issued on engine; returns the list and its listener."""
+        commits = []
+
+        def on_commit(connection):
+            commits.append(connection)
+
+        event.listen(engine, "commit", on_commit)
+        return commits, on_commit
+
+    def test_save_order_commits_own_transaction(self, db_session, order_db, make_product, mock_cache):
+        """Test that save() commits even if a read already began the session's transaction."""
+        service = OrderService(db_session)
+        product = make_product(price=10.0, stock=5)
+        engine = db_session.get_bind()
+
+        commits, on_commit = self._count_commits(engine)
+        try:
+            # Expired after the fixture's commit: refreshing it autobegins a transaction
+            client_id = order_db["client"].id_key
+            assert db_session.in_transaction()
+
+            result = service.save(self._order_schema(client_id, [(product.id_key, 2)]))
+        finally:
+            event.remove(engine, "commit", on_commit)
+
+        assert len(commits) == 1
+        assert not db_session.in_transaction()
+        assert db_session.get(OrderModel, result.id_key) is not None
+        # Product cache invalidated once committed
+        assert mock_cache.data["products:list:ver"] == "1"
+
+    def test_save_order_rounds_detail_price_half_up(self, db_session, order_db, make_product, mock_cache):
+        """Test that a detail price of 2.675 is stored as 2.68, not 2.67."""
+        service = OrderService(db_session)
+        product = make_product(price=2.675)
+
+        result = service.save(self._order_schema(order_db["client"].id_key, [(product.id_key, 1)]))
+
+        detail = db_session.query(OrderDetailModel).filter_by(order_id=result.id_key).one()
+        assert detail.price == 2.68
+        assert result.total == 2.68
+
+    def test_save_order_totals_in_whole_cents(self, db_session, order_db, make_product, mock_cache):
+        """Test that 3 x 0.10 totals exactly 0.30 (0.1 * 3 == 0.30000000000000004 in floats)."""
+        service = OrderService(db_session)
+        product = make_product(price=0.10)
+
+        result = service.save(self._order_schema(order_db["client"].id_key, [(product.id_key, 3)]))
+
+        assert result.total == 0.30
+        assert db_session.get(BillModel, result.bill_id).total == 0.30
+
+    def test_save_order_rounds_discount_to_cents(self, db_session, order_db, make_product, mock_cache):
+        """Test that a 10% discount on 3.18 is 0.32 (0.318 rounded half up) and the total 2.86."""
+        service = OrderService(db_session)
+        product = make_product(price=3.18)
+
+        result = service.save(
+            self._order_schema(order_db["client"].id_key, [(product.id_key, 1)], discount_pct=10)
+        )
+
+        bill = db_session.get(BillModel, result.bill_id)
+        assert bill.discount == 0.32
+        assert bill.total == 2.86
+        assert result.total == 2.86
+
+    def test_save_order_full_discount_clamps_to_zero(self, db_session, order_db, make_product, mock_cache):
+        """Test that discount_pct=100 leaves a total of 0."""
+        service = OrderService(db_session)
+        product = make_product(price=3.18)
+
+        result = service.save(
+            self._order_schema(order_db["client"].id_key, [(product.id_key, 2)], discount_pct=100)
+        )
+
+        bill = db_session.get(BillModel, result.bill_id)
+        assert bill.discount == 6.36
+        assert bill.total == 0
+        assert result.total == 0
+
+    def test_save_order_stock_lowered_concurrently(self, db_session, order_db, make_product, mock_cache):
+        """Test that the guarded UPDATE rejects an order whose stock dropped after it was read."""
+        service = OrderService(db_session)
+        first_id = make_product(price=1.0, stock=5).id_key
+        second_id = make_product(price=2.0, stock=5).id_key
+        decrement_stock = service._decrement_stock
+
+        def lower_stock_then_decrement(stock_updates):
+            # Runs after the products were read and checked, before the decrement
+            db_session.execute(update(ProductModel).where(ProductModel.id_key == second_id).values(stock=1))
+            return decrement_stock(stock_updates)
+
+        service._decrement_stock = lower_stock_then_decrement
+
+        with pytest.raises(ValueError) as exc_info:
+            service.save(self._order_schema(order_db["client"].id_key, [(first_id, 2), (second_id, 2)]))
+
+        # Only the product the guard skipped is named, with its current stock
+        assert str(exc_info.value) == (
+            f"No hay stock suficiente para el producto {second_id}. Disponible: 1, solicitado: 2."
+        )
+        assert db_session.get(ProductModel, first_id).stock == 5
+        assert db_session.get(ProductModel, second_id).stock == 5
+        for model in (OrderModel, BillModel, OrderDetailModel):
+            assert db_session.scalar(select(func.count()).select_from(model)) == 0
+        assert "products:list:ver" not in mock_cache.data
+
+    def test_save_order_insufficient_stock_one_product(self, db_session, order_db, make_product, mock_cache):
+        """Test the error message when a single product is short."""
+        service = OrderService(db_session)
+        enough_id = make_product(price=1.0, stock=5).id_key
+        short_id = make_product(price=2.0, stock=1).id_key
+
+        with pytest.raises(ValueError) as exc_info:
+            service.save(self._order_schema(order_db["client"].id_key, [(enough_id, 2), (short_id, 2)]))
+
+        assert str(exc_info.value) == (
+            f"No hay stock suficiente para el producto {short_id}. Disponible: 1, solicitado: 2."
+        )
+
+    def test_save_order_insufficient_stock_several_products(self, db_session, order_db, make_product, mock_cache):
+        """Test that the error names every product without enough stock."""
+        service = OrderService(db_session)
+        first_id = make_product(price=1.0, stock=1).id_key
+        second_id = make_product(price=2.0, stock=0).id_key
+
+        with pytest.raises(ValueError) as exc_info:
+            service.save(self._order_schema(order_db["client"].id_key, [(first_id, 2), (second_id, 3)]))
+
+        assert str(exc_info.value) == (
+            "No hay stock suficiente para los productos: "
+            f"producto {first_id} (disponible: 1, solicitado: 2); "
+            f"producto {second_id} (disponible: 0, solicitado: 3)."
+        )
+
+    def test_save_order_insufficient_stock_across_lines(self, db_session, order_db, make_product, mock_cache):
+        """Test that lines for the same product are added up before checking its stock."""
+        service = OrderService(db_session)
+        product_id = make_product(price=1.0, stock=5).id_key
+
+        with pytest.raises(ValueError) as exc_info:
+            service.save(self._order_schema(order_db["client"].id_key, [(product_id, 3), (product_id, 3)]))
+
+        assert str(exc_info.value) == (
+            f"No hay stock suficiente para el producto {product_id}. Disponible: 5, solicitado: 6."
+        )
+        assert db_session.get(ProductModel, product_id).stock == 5
+
+    def test_rejected_orders_do_not_use_up_numbers(self, db_session, order_db, make_product, mock_cache):
+        """Test that orders failing validation don't allocate an order/bill number."""
+        service = OrderService(db_session)
+        product_id = make_product(price=1.0, stock=1).id_key
+        client_id = order_db["client"].id_key
+
+        with pytest.raises(ValueError):
+            service.save(self._order_schema(client_id, [(product_id, 2)]))
+
+        schema = self._order_schema(client_id, [(product_id, 1)])
+        schema.bill_id = 9999
+        with pytest.raises(InstanceNotFoundError):
+            service.save(schema)
+
+        assert "order:next_number" not in mock_cache.data
+        result = service.save(self._order_schema(client_id, [(product_id, 1)]))
+        assert result.id_key == 1000
+
+    def test_decrement_stock_single_statement(self, db_session, make_product):
+        """Test that every product's stock is decremented by one guarded UPDATE."""
+        service = OrderService(db_session)
+        first_id = make_product(price=1.0, stock=5).id_key
+        second_id = make_product(price=2.0, stock=1).id_key
+        engine = db_session.get_bind()
+        statements = []
+
+        def on_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", on_execute)
+        try:
+            service._decrement_stock([{"pid": first_id, "q": 2}, {"pid": second_id, "q": 1}])
+        finally:
+            event.remove(engine, "before_cursor_execute", on_execute)
+
+        assert len(statements) == 1
+        assert db_session.get(ProductModel, first_id).stock == 3
+        assert db_session.get(ProductModel, second_id).stock == 0
+
+        with pytest.raises(ValueError) as exc_info:
+            service._decrement_stock([{"pid": first_id, "q": 1}, {"pid": second_id, "q": 1}])
+        # The guard leaves the short row untouched
+        assert db_session.get(ProductModel, second_id).stock == 0
+        assert str(exc_info.value) == (
+            f"No hay stock suficiente para el producto {second_id}. Disponible: 0, solicitado: 1."
+        )
+
+    def test_save_order_invalidates_only_ordered_products(self, db_session, order_db, make_product, mock_cache):
+        """Test that an order drops the ordered products' cache entries and bumps the list version."""
+        service = OrderService(db_session)
+        ordered_id = make_product(price=1.0).id_key
+        other_id = make_product(price=2.0).id_key
+        mock_cache.set(f"products:id:id:{ordered_id}", "{}")
+        mock_cache.set(f"products:id:id:{other_id}", "{}")
+
+        service.save(self._order_schema(order_db["client"].id_key, [(ordered_id, 1)]))
+
+        assert f"products:id:id:{ordered_id}" not in mock_cache.data
+        assert f"products:id:id:{other_id}" in mock_cache.data
+        assert mock_cache.data["products:list:ver"] == "1"
+
+    def test_save_order_product_list_cache_misses_after_order(self, db_session, order_db, make_product, mock_cache):
+        """Test that product list pages cached before an order are not served after it."""
+        product_id = make_product(price=1.0, stock=5).id_key
+        product_service = ProductService(db_session)
+
+        assert product_service.get_all()[0].stock == 5
+        assert "products:list:limit:100:skip:0:v:0" in mock_cache.data
+
+        OrderService(db_session).save(self._order_schema(order_db["client"].id_key, [(product_id, 2)]))
+
+        assert product_service.get_all()[0].stock == 3
+        assert "products:list:limit:100:skip:0:v:1" in mock_cache.data
+
+    def test_save_order_full_product_cache_invalidation(self, db_session, order_db, make_product, mock_cache,
+                                                        monkeypatch):
+        """Test that ORDER_FULL_PRODUCT_CACHE_INVALIDATION still wipes every products:* key."""
+        monkeypatch.setattr("services.order_service.FULL_PRODUCT_CACHE_INVALIDATION", True)
+        service = OrderService(db_session)
+        ordered_id = make_product(price=1.0).id_key
+        other_id = make_product(price=2.0).id_key
+        mock_cache.set(f"products:id:id:{other_id}", "{}")
+        mock_cache.set("products:list:limit:100:skip:0:v:0", "[]")
+        mock_cache.set("categories:list", "[]")
+
+        service.save(self._order_schema(order_db["client"].id_key, [(ordered_id, 1)]))
+
+        assert not [key for key in mock_cache.data if key.startswith("products:")]
+        assert "categories:list" in mock_cache.data
+
 
 class TestOrderDetailService:
     """Tests for OrderDetailService with stock management."""
@@ -501,6 +860,18 @@ class TestBillService:
         assert result.discount == 20.0
         assert result.total == 900.0
 
+    def test_delete_bill_drops_cached_existence(self, db_session, mock_cache):
+        """Test that deleting a bill drops its bills:exists cache entry."""
+        service = BillService(db_session)
+        bill = BillModel(bill_number="BILL-DEL-001", total=10.0, payment_type=PaymentType.CASH)
+        db_session.add(bill)
+        db_session.commit()
+        mock_cache.set(f"bills:exists:id:{bill.id_key}", "1")
+
+        service.delete(bill.id_key)
+
+        assert f"bills:exists:id:{bill.id_key}" not in mock_cache.data
+
 
 class TestAddressService:
     """Tests for AddressService."""